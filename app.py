@@ -3,6 +3,12 @@ Bra Fit Finder MVP
 A Streamlit application for nursing bra size recommendation using MediaPipe pose detection.
 """
 
+import io
+import logging
+import mmap
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import streamlit as st
@@ -11,9 +17,22 @@ import numpy as np
 
 # MediaPipe Tasks API (Pose Landmarker)
 from mediapipe.tasks.python import vision
+from mediapipe.tasks.python.core.base_options import BaseOptions
 from mediapipe.tasks.python.vision.core.image import Image, ImageFormat
 
-from logic import compute_bra_fit
+import download_model
+from logic import compute_bra_fit, landmarks_to_array
+
+# Optional SIMD JPEG decode (libjpeg-turbo) + resize (OpenCV); PIL is the fallback
+try:
+    import cv2
+    from turbojpeg import TJPF_RGB, TurboJPEG
+
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # package or libturbojpeg missing
+    _turbo_jpeg = None
+
+logger = logging.getLogger(__name__)
 
 
 # -----------------------------------------------------------------------------
@@ -31,11 +50,208 @@ st.set_page_config(
 # -----------------------------------------------------------------------------
 MODEL_PATH = Path(__file__).parent / "models" / "pose_landmarker.task"
 
+# Long-edge cap for images fed to the landmarker. The model resizes to 256x256
+# internally, and landmarks are normalised (0–1), so full-resolution phone
+# photos only add decode and copy cost.
+INFERENCE_MAX_SIZE = (512, 512)
+
+# Long-edge cap for the upload previews; the centred layout column is ~700 px wide
+PREVIEW_MAX_SIZE = (800, 800)
+
+
+def _create_landmarker(delegate):
+    """Build a single-image Pose Landmarker on the requested TFLite delegate."""
+    options = vision.PoseLandmarkerOptions(
+        base_options=BaseOptions(
+            model_asset_path=str(MODEL_PATH),
+            delegate=delegate,
+        ),
+        running_mode=vision.RunningMode.IMAGE,
+        num_poses=1,
+    )
+    return vision.PoseLandmarker.create_from_options(options)
+
+
+def _prefetch_model():
+    """
+    Ask the OS to read the model file into the page cache ahead of use.
+    MediaPipe memory-maps model_asset_path itself, so the landmarkers (and other
+    Streamlit worker processes) share these read-only pages rather than each
+    holding a heap copy, which passing model_asset_buffer would create.
+    """
+    if not hasattr(mmap, "MADV_WILLNEED"):
+        return  # madvise is not available on this platform
+    with open(MODEL_PATH, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.madvise(mmap.MADV_WILLNEED)
+
+
+# Blank frame used to exercise a new landmarker's delegate before it is trusted
+_WARM_UP_IMAGE = Image(image_format=ImageFormat.SRGB, data=np.zeros((64, 64, 3), np.uint8))
+
+
+def _create_landmarker_with_fallback():
+    """
+    Prefer the GPU delegate and fall back to CPU (XNNPACK) when no usable
+    GPU / GL context is available, e.g. on a headless server. Some GPU setups
+    only fail once the first frame is run, so the GPU landmarker must complete a
+    warm-up detect() before it is accepted.
+    """
+    landmarker = None
+    try:
+        landmarker = _create_landmarker(BaseOptions.Delegate.GPU)
+        landmarker.detect(_WARM_UP_IMAGE)
+        return landmarker
+    except (RuntimeError, NotImplementedError):
+        if landmarker is not None:
+            landmarker.close()
+        return _create_landmarker(BaseOptions.Delegate.CPU)
+
+
+class PoseDetectorPair:
+    """
+    Front and side Pose Landmarkers, each with its own TFLite interpreter, so
+    the two detections can run in parallel: MediaPipe releases the GIL inside
+    detect(), so the front photo runs on a worker thread while the side photo
+    runs on the calling thread.
+    """
+
+    def __init__(self):
+        _prefetch_model()
+        self._front = _create_landmarker_with_fallback()
+        self._side = _create_landmarker_with_fallback()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pose-front")
+        # The cached pair is shared by every session; a landmarker serves one call at a time
+        self._lock = threading.Lock()
+
+    def detect_pair(self, front_mp_image, side_mp_image):
+        """Run front and side pose detection concurrently and return both results."""
+        with self._lock:
+            front_future = self._pool.submit(self._front.detect, front_mp_image)
+            side_results = self._side.detect(side_mp_image)
+            return front_future.result(), side_results
+
 
 @st.cache_resource
 def get_pose_detector():
-    """Initialise and cache the MediaPipe Pose Landmarker for efficiency."""
-    return vision.PoseLandmarker.create_from_model_path(str(MODEL_PATH))
+    """Initialise and cache the MediaPipe Pose Landmarkers for efficiency."""
+    return PoseDetectorPair()
+
+
+@st.cache_resource
+def _start_model_download():
+    """Fetch a missing pose model in the background, once per Streamlit process."""
+    thread = threading.Thread(target=download_model.main, name="model-download", daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def _warm_up_detector():
+    """
+    Load the pose detector once per Streamlit process. Returns the exception
+    if loading failed (e.g. a corrupt .task) instead of raising it, so the
+    failure is cached and reported rather than retried on every rerun.
+    """
+    try:
+        get_pose_detector()
+    except Exception as e:
+        logger.exception("Could not load the pose model from %s", MODEL_PATH)
+        return e
+    return None
+
+
+# Warm up during the first script run (page load) rather than on the first
+# "Find My Size" click; both calls are cached, so later reruns are no-ops.
+if MODEL_PATH.exists():
+    _warm_up_detector()
+else:
+    _start_model_download()
+
+
+def _decode_jpeg(image_bytes):
+    """
+    Decode and downscale a JPEG with libjpeg-turbo and OpenCV. Returns None
+    when unavailable or the file is not a JPEG turbojpeg can decode to RGB
+    (e.g. CMYK), so the caller falls back to PIL.
+    """
+    if _turbo_jpeg is None or not image_bytes.startswith(b"\xff\xd8"):
+        return None
+    try:
+        # PyTurboJPEG reports libjpeg-turbo warnings (e.g. "Premature end of JPEG
+        # file") via warnings.warn and returns a partly decoded image; treat them
+        # as failures so PIL decodes or rejects the file, as it always has
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            width, height = _turbo_jpeg.decode_header(image_bytes)[:2]
+            # Fit within the same box as PILImage.thumbnail, preserving aspect
+            scale = min(INFERENCE_MAX_SIZE[0] / width, INFERENCE_MAX_SIZE[1] / height)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            # Let the decoder do most of the reduction in the DCT domain: the
+            # largest 1/2, 1/4 or 1/8 factor that still leaves at least `size`
+            denom = next((d for d in (8, 4, 2) if scale * d <= 1), 1)
+            arr = _turbo_jpeg.decode(
+                image_bytes, pixel_format=TJPF_RGB, scaling_factor=(1, denom)
+            )
+    except (OSError, ValueError, Warning):  # ValueError: scaling / lossless checks
+        return None
+    if scale < 1:
+        # INTER_AREA averages over each output pixel's source footprint, so it
+        # antialiases like PIL's reduction-scaled BILINEAR filter (INTER_LINEAR
+        # samples only 2x2 source pixels and aliases at large reductions).
+        # Output sizes can differ from thumbnail's by a pixel of rounding.
+        arr = cv2.resize(arr, size, interpolation=cv2.INTER_AREA)
+    return arr
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _load_rgb(image_bytes):
+    """
+    Decode an upload into a downscaled, C-contiguous RGB array. Cached on the
+    file bytes so unchanged photos are not re-decoded on every rerun.
+    """
+    arr = _decode_jpeg(image_bytes)
+    if arr is not None:
+        return np.ascontiguousarray(arr)
+    img = PILImage.open(io.BytesIO(image_bytes)).convert("RGB")
+    img.thumbnail(INFERENCE_MAX_SIZE, PILImage.Resampling.BILINEAR)
+    return np.ascontiguousarray(np.asarray(img))
+
+
+def _to_mp_image(image_bytes):
+    """Wrap a decoded upload as a MediaPipe Image (Image() copies the array once)."""
+    return Image(
+        image_format=ImageFormat.SRGB,
+        data=_load_rgb(image_bytes),
+    )
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _detect_landmarks(front_bytes, side_bytes):
+    """
+    Run pose detection on a front/side upload pair and return the (33, 3)
+    landmark arrays (None where no pose was found). Keyed on the file bytes,
+    so reruns with the same photos (e.g. after changing the weeks input)
+    skip inference; arrays are returned because the MediaPipe result objects
+    cannot be pickled into the cache.
+    """
+    front_results, side_results = get_pose_detector().detect_pair(
+        _to_mp_image(front_bytes), _to_mp_image(side_bytes)
+    )
+    return landmarks_to_array(front_results), landmarks_to_array(side_results)
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _preview_thumbnail(image_bytes):
+    """
+    JPEG-encoded preview of an upload, capped at PREVIEW_MAX_SIZE, so the
+    browser is not sent (and does not re-scale) the full-resolution photo.
+    """
+    img = PILImage.open(io.BytesIO(image_bytes)).convert("RGB")
+    img.thumbnail(PREVIEW_MAX_SIZE, PILImage.Resampling.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
 
 
 # -----------------------------------------------------------------------------
@@ -94,7 +310,7 @@ def main():
             help="A clear front-facing photo in good lighting.",
         )
         if front_image:
-            st.image(front_image, use_container_width=True)
+            st.image(_preview_thumbnail(front_image.getvalue()), use_container_width=True)
 
     with side_col:
         side_image = st.file_uploader(
@@ -103,7 +319,7 @@ def main():
             help="A clear side-profile photo in good lighting.",
         )
         if side_image:
-            st.image(side_image, use_container_width=True)
+            st.image(_preview_thumbnail(side_image.getvalue()), use_container_width=True)
 
     st.divider()
 
@@ -113,37 +329,38 @@ def main():
             st.warning("Please upload both front and side images to continue.")
         else:
             if not MODEL_PATH.exists():
-                st.error(
-                    "Pose model not found. Run `python download_model.py` to download it, "
-                    "or place pose_landmarker.task in the models/ directory."
-                )
+                if _start_model_download().is_alive():
+                    st.warning("The pose model is still downloading. Please try again in a moment.")
+                else:
+                    # The download thread died without producing the model; drop
+                    # the cached thread so the next script run starts a new one
+                    _start_model_download.clear()
+                    st.error(
+                        "Pose model not found and the automatic download failed. "
+                        "Reload the page to retry it, run `python download_model.py`, "
+                        "or place pose_landmarker.task in the models/ directory."
+                    )
                 st.stop()
 
             with st.spinner("Analysing your photos..."):
-                landmarker = get_pose_detector()
-
-                # Convert uploads to RGB numpy arrays for MediaPipe
-                front_img = PILImage.open(front_image).convert("RGB")
-                side_img = PILImage.open(side_image).convert("RGB")
-                front_arr = np.array(front_img)
-                side_arr = np.array(side_img)
-
-                # Create MediaPipe Image objects and run detection
-                front_mp_image = Image(
-                    image_format=ImageFormat.SRGB,
-                    data=front_arr,
-                )
-                side_mp_image = Image(
-                    image_format=ImageFormat.SRGB,
-                    data=side_arr,
+                load_error = _warm_up_detector()
+                if load_error is not None:
+                    st.error(
+                        f"The pose model could not be loaded ({load_error}). It may be "
+                        f"corrupt: delete {MODEL_PATH.name} from the models/ directory, "
+                        "run `python download_model.py` again and restart the app."
+                    )
+                    st.stop()
+
+                # Pose detection, cached on the uploaded file bytes
+                front_pts, side_pts = _detect_landmarks(
+                    front_image.getvalue(), side_image.getvalue()
                 )
-                front_results = landmarker.detect(front_mp_image)
-                side_results = landmarker.detect(side_mp_image)
 
                 # Run full pipeline: extract landmarks, volume estimate, growth curve, bra size
                 result = compute_bra_fit(
-                    front_results,
-                    side_results,
+                    front_pts,
+                    side_pts,
                     weeks_postpartum=weeks_input,
                 )
 
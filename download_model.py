@@ -1,32 +1,158 @@
 """
 Download the MediaPipe Pose Landmarker model for Bra Fit Finder.
 Run once before first use: python download_model.py
+
+Integrity: Google does not publish a checksum for the model bundle, so by
+default the download is NOT verified beyond matching its Content-Length; the
+SHA-256 is only printed. Set BRA_FIT_MODEL_SHA256 to the expected hex digest
+to have a mismatching download rejected.
 """
 
-import urllib.request
+import hashlib
+import json
+import os
 from pathlib import Path
 
+import requests
+
 # Lite model (smaller, faster) - suitable for MVP
-MODEL_URL = (
+DEFAULT_MODEL_URL = (
     "https://storage.googleapis.com/mediapipe-models/"
     "pose_landmarker/pose_landmarker_lite/float16/1/"
     "pose_landmarker_lite.task"
 )
+# Google only publishes float16 Pose Landmarker bundles. Point BRA_FIT_MODEL_URL at
+# an int8-quantised .task to use it instead: XNNPACK picks its int8 kernels
+# automatically for quantised tensors, so app.py needs no changes.
+MODEL_URL = os.environ.get("BRA_FIT_MODEL_URL", DEFAULT_MODEL_URL)
+# Expected SHA-256 of MODEL_URL (see module docstring); unset means unverified
+MODEL_SHA256 = os.environ.get("BRA_FIT_MODEL_SHA256", "").strip().lower() or None
 MODEL_DIR = Path(__file__).parent / "models"
 MODEL_PATH = MODEL_DIR / "pose_landmarker.task"
+# Partial downloads land here and are resumed on the next run (only from the same
+# URL and server-side version, tracked in a .part.json sidecar); the file is only
+# renamed to MODEL_PATH once complete, so the app never loads a truncated model.
+PARTIAL_PATH = MODEL_PATH.with_name(MODEL_PATH.name + ".part")
+
+# URL the installed model was downloaded from. A model with no record (installed
+# before this was tracked, or placed by hand) is treated as DEFAULT_MODEL_URL.
+MODEL_SOURCE_PATH = MODEL_PATH.with_name(MODEL_PATH.name + ".source")
+
+CHUNK_SIZE = 1 << 20  # 1 MiB
+TIMEOUT_SECONDS = 30
+
+
+def _validator(headers) -> str:
+    """Strong ETag, else Last-Modified: the value If-Range can safely compare."""
+    etag = headers.get("etag", "")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("last-modified", "")
+
+
+def _partial_meta_path(dest: Path) -> Path:
+    """Sidecar recording which URL and version a .part file was downloaded from."""
+    return dest.with_name(dest.name + ".json")
+
+
+def _discard_partial(dest: Path) -> None:
+    dest.unlink(missing_ok=True)
+    _partial_meta_path(dest).unlink(missing_ok=True)
+
+
+def _download(url: str, dest: Path) -> str:
+    """Stream url into dest, resuming a partial file. Returns the SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    meta_path = _partial_meta_path(dest)
+
+    # Only resume bytes known to come from this URL at a version the server can
+    # confirm is unchanged; anything else would splice two different files.
+    validator = ""
+    if dest.exists():
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            meta = {}
+        validator = meta.get("validator", "") if meta.get("url") == url else ""
+        if not validator:
+            _discard_partial(dest)
+    offset = dest.stat().st_size if dest.exists() else 0
+    headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+
+    with requests.get(url, stream=True, timeout=TIMEOUT_SECONDS, headers=headers) as r:
+        if r.status_code == 416:  # Range not satisfiable: partial file is stale
+            _discard_partial(dest)
+            return _download(url, dest)
+        r.raise_for_status()
+
+        if r.status_code == 206 and _validator(r.headers) == validator:
+            # Resuming: fold the bytes already on disk into the digest first
+            with open(dest, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            mode = "ab"
+        elif r.status_code == 206:
+            # Partial content for a different version: drop ours and start over
+            r.close()
+            _discard_partial(dest)
+            return _download(url, dest)
+        else:
+            # Fresh download, or a 200 because the file changed (If-Range) or the
+            # server ignores Range: the old partial is replaced
+            _discard_partial(dest)
+            meta_path.write_text(json.dumps({"url": url, "validator": _validator(r.headers)}))
+            mode = "wb"
+
+        # content-length counts encoded bytes, so only check it for identity transfers
+        remaining = int(r.headers.get("content-length", 0))
+        if r.headers.get("content-encoding"):
+            remaining = 0
+        written = 0
+        with open(dest, mode) as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+
+    if remaining and written != remaining:
+        raise IOError(f"Incomplete download: got {written} of {remaining} bytes")
+    return digest.hexdigest()
+
+
+def _installed_model_url() -> str:
+    """Source URL recorded for the installed model (see MODEL_SOURCE_PATH)."""
+    try:
+        return MODEL_SOURCE_PATH.read_text().strip() or DEFAULT_MODEL_URL
+    except OSError:
+        return DEFAULT_MODEL_URL
 
 
 def main():
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
     if MODEL_PATH.exists():
-        print(f"Model already exists at {MODEL_PATH}")
-        return
+        installed_url = _installed_model_url()
+        if installed_url == MODEL_URL:
+            print(f"Model already exists at {MODEL_PATH}")
+            return
+        print(
+            f"Installed model came from {installed_url};\n"
+            f"replacing it with {MODEL_URL} (restart the app to load it)."
+        )
 
     print(f"Downloading Pose Landmarker model to {MODEL_PATH}...")
     try:
-        urllib.request.urlretrieve(MODEL_URL, MODEL_PATH)
-        print("Download complete.")
+        sha256 = _download(MODEL_URL, PARTIAL_PATH)
+        if MODEL_SHA256 and sha256 != MODEL_SHA256:
+            _discard_partial(PARTIAL_PATH)
+            raise IOError(f"Checksum mismatch: expected {MODEL_SHA256}, got {sha256}")
+        PARTIAL_PATH.replace(MODEL_PATH)
+        _partial_meta_path(PARTIAL_PATH).unlink(missing_ok=True)
+        MODEL_SOURCE_PATH.write_text(MODEL_URL)
+        if MODEL_SHA256:
+            print(f"Download complete; sha256 verified ({sha256}).")
+        else:
+            print(f"Download complete (unverified, sha256 {sha256}).")
     except Exception as e:
         print(f"Download failed: {e}")
         print(
@@ -3,36 +3,37 @@ Bra Fit Finder - Core Logic
 Modular business logic for bra size estimation from MediaPipe pose landmarks.
 """
 
-import math
 from dataclasses import dataclass
-from typing import Optional
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the same code then runs as plain NumPy
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 # MediaPipe Pose landmark indices (33 landmarks, same for solutions.pose and tasks.vision)
+NUM_LANDMARKS = 33
 LEFT_SHOULDER = 11
 RIGHT_SHOULDER = 12
 LEFT_HIP = 23
 RIGHT_HIP = 24
 
 
-@dataclass
-class LandmarkCoords:
-    """Normalised landmark coordinates (x, y, z in 0–1 range)."""
+class ExtractedLandmarks(NamedTuple):
+    """Key body landmarks extracted for bra fitting, each an (x, y, z) float32 row."""
 
-    x: float
-    y: float
-    z: float
-
-
-@dataclass
-class ExtractedLandmarks:
-    """Key body landmarks extracted for bra fitting."""
-
-    shoulder_left: LandmarkCoords
-    shoulder_right: LandmarkCoords
-    mid_bust: LandmarkCoords
-    under_bust: LandmarkCoords
-    hip_left: LandmarkCoords
-    hip_right: LandmarkCoords
+    shoulder_left: np.ndarray
+    shoulder_right: np.ndarray
+    mid_bust: np.ndarray
+    under_bust: np.ndarray
+    hip_left: np.ndarray
+    hip_right: np.ndarray
 
 
 @dataclass
@@ -45,62 +46,59 @@ class BraFitResult:
     landmarks_detected: bool
 
 
-def _get_landmarks_list(pose_results) -> Optional[list]:
+def landmarks_to_array(pose_results) -> Optional[np.ndarray]:
     """
-    Normalise pose results to a list of 33 landmarks.
+    Normalise pose results to a (33, 3) float32 array of x, y, z coordinates.
     Supports both legacy (solutions.pose) and Tasks API (PoseLandmarker) formats.
     """
-    if pose_results is None or not hasattr(pose_results, "pose_landmarks"):
+    if pose_results is None:
         return None
     pl = pose_results.pose_landmarks
-    if isinstance(pl, list) and len(pl) > 0:
-        return pl[0]  # Tasks API: list of poses, each pose is list of landmarks
-    if hasattr(pl, "landmark"):
-        return list(pl.landmark)  # Legacy solutions.pose format
-    return None
-
-
-def _landmark_from_list(landmarks_list: list, index: int) -> Optional[LandmarkCoords]:
-    """Extract a single landmark from a list of MediaPipe landmarks."""
-    if landmarks_list is None or index >= len(landmarks_list):
-        return None
-    lm = landmarks_list[index]
-    x = getattr(lm, "x", None)
-    y = getattr(lm, "y", None)
-    z = getattr(lm, "z", None)
-    if x is None or y is None:
+    if isinstance(pl, list):
+        # Tasks API: list of poses, each pose is list of landmarks
+        if not pl:
+            return None
+        landmarks_list = pl[0]
+    elif pl is None:
+        return None  # Legacy format, no pose detected
+    else:
+        landmarks_list = pl.landmark  # Legacy solutions.pose format
+    if len(landmarks_list) < NUM_LANDMARKS:
         return None
-    return LandmarkCoords(x=float(x), y=float(y), z=float(z or 0))
+    return np.fromiter(
+        (c for lm in landmarks_list[:NUM_LANDMARKS] for c in (lm.x, lm.y, lm.z)),
+        dtype=np.float32,
+        count=NUM_LANDMARKS * 3,
+    ).reshape(NUM_LANDMARKS, 3)
 
 
-def _midpoint(a: LandmarkCoords, b: LandmarkCoords) -> LandmarkCoords:
+@njit(cache=True)
+def _midpoint(a: np.ndarray, b: np.ndarray) -> np.ndarray:
     """Return the midpoint between two landmarks."""
-    return LandmarkCoords(
-        x=(a.x + b.x) / 2,
-        y=(a.y + b.y) / 2,
-        z=(a.z + b.z) / 2,
-    )
+    return (a + b) * np.float32(0.5)
 
 
+@njit(cache=True)
 def _interpolate_vertical(
-    shoulder_mid: LandmarkCoords,
-    hip_mid: LandmarkCoords,
+    shoulder_mid: np.ndarray,
+    hip_mid: np.ndarray,
     fraction: float,
-) -> LandmarkCoords:
+) -> np.ndarray:
     """
     Interpolate a point between shoulder and hip midpoints.
     fraction=0 is at shoulder, fraction=1 is at hip.
     """
-    return LandmarkCoords(
-        x=shoulder_mid.x + fraction * (hip_mid.x - shoulder_mid.x),
-        y=shoulder_mid.y + fraction * (hip_mid.y - shoulder_mid.y),
-        z=shoulder_mid.z + fraction * (hip_mid.z - shoulder_mid.z),
-    )
+    return shoulder_mid + fraction * (hip_mid - shoulder_mid)
 
 
-def _distance(a: LandmarkCoords, b: LandmarkCoords) -> float:
-    """Euclidean distance between two landmarks."""
-    return math.sqrt((a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2)
+@njit(cache=True)
+def _sqdist(a: np.ndarray, b: np.ndarray) -> float:
+    """Squared Euclidean distance between two landmarks."""
+    # Unrolled over x, y, z: no temporary difference array
+    dx = a[0] - b[0]
+    dy = a[1] - b[1]
+    dz = a[2] - b[2]
+    return dx * dx + dy * dy + dz * dz
 
 
 # -----------------------------------------------------------------------------
@@ -120,39 +118,67 @@ RATIO_UNDER_BUST = 0.53  # Inframammary Fold (Band Line)
 RATIO_BREAST_WIDTH = 0.35
 
 
-def extract_landmarks(pose_results) -> Optional[ExtractedLandmarks]:
-    """
-    Extract landmarks using empirically derived vertical ratios.
-    """
-    landmarks = _get_landmarks_list(pose_results)
-    if landmarks is None:
-        return None
-
-    shoulder_left = _landmark_from_list(landmarks, LEFT_SHOULDER)
-    shoulder_right = _landmark_from_list(landmarks, RIGHT_SHOULDER)
-    hip_left = _landmark_from_list(landmarks, LEFT_HIP)
-    hip_right = _landmark_from_list(landmarks, RIGHT_HIP)
-
-    if not all([shoulder_left, shoulder_right, hip_left, hip_right]):
-        return None
+@njit(cache=True)
+def _torso_landmarks(pts):
+    """Derive the ExtractedLandmarks fields, in order, from a (33, 3) landmark array."""
+    # Row views into pts; float32 constants below keep Numba from upcasting to float64
+    shoulder_left = pts[LEFT_SHOULDER]
+    shoulder_right = pts[RIGHT_SHOULDER]
+    hip_left = pts[LEFT_HIP]
+    hip_right = pts[RIGHT_HIP]
 
     shoulder_mid = _midpoint(shoulder_left, shoulder_right)
     hip_mid = _midpoint(hip_left, hip_right)
 
     # Mid-bust: 44% down (matches ~23-24cm drop from shoulder)
-    mid_bust = _interpolate_vertical(shoulder_mid, hip_mid, RATIO_MID_BUST)
+    mid_bust = _interpolate_vertical(shoulder_mid, hip_mid, np.float32(RATIO_MID_BUST))
 
     # Under-bust: 53% down (matches ~31cm drop from shoulder)
-    under_bust = _interpolate_vertical(shoulder_mid, hip_mid, RATIO_UNDER_BUST)
-
-    return ExtractedLandmarks(
-        shoulder_left=shoulder_left,
-        shoulder_right=shoulder_right,
-        mid_bust=mid_bust,
-        under_bust=under_bust,
-        hip_left=hip_left,
-        hip_right=hip_right,
-    )
+    under_bust = _interpolate_vertical(shoulder_mid, hip_mid, np.float32(RATIO_UNDER_BUST))
+
+    return shoulder_left, shoulder_right, mid_bust, under_bust, hip_left, hip_right
+
+
+def extract_landmarks(pose_results) -> Optional[ExtractedLandmarks]:
+    """
+    Extract landmarks using empirically derived vertical ratios.
+    """
+    pts = landmarks_to_array(pose_results)
+    if pts is None:
+        return None
+    return ExtractedLandmarks(*_torso_landmarks(pts))
+
+
+# Hemi-ellipsoid constants folded into one factor:
+# - Breast width = front shoulder width * RATIO_BREAST_WIDTH (anthropometric ratio)
+# - Breast height = side mid-bust to under-bust span * 2.0 (radius to diameter)
+# - Breast projection = side profile depth * 0.60 (heuristic: ~60% of side depth)
+# - Ellipsoid volume V = π/3 * R_width * R_height * Length; with full diameters
+#   V ≈ 0.52 * W * H * P
+# - Scale factor 2200.0 (calibrated to new unit range)
+_VOL_K = np.float32(0.52 * RATIO_BREAST_WIDTH * 2.0 * 0.60 * 2200.0)
+
+
+@njit(cache=True)
+def _hemi_ellipsoid_volume(
+    front_shoulder_left,
+    front_shoulder_right,
+    side_mid_bust,
+    side_under_bust,
+    side_shoulder_left,
+    side_shoulder_right,
+):
+    """Hemi-ellipsoid volume from the six landmark rows it depends on."""
+    # Front: shoulder width (squared)
+    frame_width_sq = _sqdist(front_shoulder_left, front_shoulder_right)
+    # Side: mid-bust to under-bust span (squared)
+    radius_height_sq = _sqdist(side_mid_bust, side_under_bust)
+    # Side: raw profile depth (squared); stands in for mid-spine to nipple
+    # minus rib cage depth, scaled down to isolate breast tissue
+    side_depth_sq = _sqdist(side_shoulder_left, side_shoulder_right)
+
+    # sqrt(a²) * sqrt(b²) * sqrt(c²) == sqrt(a² * b² * c²): one sqrt, not three
+    return _VOL_K * np.sqrt(frame_width_sq * radius_height_sq * side_depth_sq)
 
 
 def calculate_volume_estimate(
@@ -164,41 +190,32 @@ def calculate_volume_estimate(
     Ref: Breast Volumetric Analysis (Qiao et al.)
     Formula: V = π/3 * (Width/2) * (Height/2) * Projection
     """
-    # 1. Breast Width (Front)
-    # Derived from shoulder width using anthropometric ratio (0.35)
-    frame_width = _distance(
-        front_landmarks.shoulder_left,
-        front_landmarks.shoulder_right,
+    return float(
+        _hemi_ellipsoid_volume(
+            front_landmarks.shoulder_left,
+            front_landmarks.shoulder_right,
+            side_landmarks.mid_bust,
+            side_landmarks.under_bust,
+            side_landmarks.shoulder_left,
+            side_landmarks.shoulder_right,
+        )
     )
-    breast_width = frame_width * RATIO_BREAST_WIDTH
 
-    # 2. Breast Height (Side)
-    # Vertical span from Mid-Bust to Under-Bust, doubled (radius to diameter)
-    radius_height = _distance(
-        side_landmarks.mid_bust,
-        side_landmarks.under_bust,
-    )
-    breast_height = radius_height * 2.0
-
-    # 3. Projection (Side)
-    # Distance from mid-spine to nipple (approx) minus rib cage depth.
-    # We use the raw side depth scaled down to isolate breast tissue.
-    side_depth_raw = _distance(
-        side_landmarks.shoulder_left,
-        side_landmarks.shoulder_right,
-    )
-    # Heuristic: Breast projection is roughly 60% of total side profile depth
-    breast_projection = side_depth_raw * 0.60
 
-    # 4. Ellipsoid Volume
-    # V = π/3 * R_width * R_height * Length
-    # Using full diameters: V ≈ 0.52 * W * H * P
-    volume_unscaled = 0.52 * breast_width * breast_height * breast_projection
+# Early postpartum engorgement (Lactogenesis II): +15% volume before 6 weeks
+EARLY_POSTPARTUM_WEEKS = 6
+ENGORGEMENT_FACTOR = 1.15
+_ENGORGEMENT_BONUS = np.float32(ENGORGEMENT_FACTOR - 1.0)
 
-    # Scale factor (calibrated to new unit range)
-    scale_factor = 2200.0
 
-    return volume_unscaled * scale_factor
+@njit(cache=True)
+def _growth_factor(weeks_postpartum):
+    """
+    float32 volume multiplier for weeks_postpartum, used by _compute_core; the
+    < 6 weeks test is used as 0/1 rather than branched on.
+    """
+    early = np.float32(weeks_postpartum < EARLY_POSTPARTUM_WEEKS)
+    return np.float32(1.0) + _ENGORGEMENT_BONUS * early
 
 
 def apply_growth_curve(volume_estimate: float, weeks_postpartum: int) -> float:
@@ -208,9 +225,8 @@ def apply_growth_curve(volume_estimate: float, weeks_postpartum: int) -> float:
     If weeks_postpartum < 6, increase volume by 15% to account for
     milk regulation and engorgement.
     """
-    if weeks_postpartum < 6:
-        return volume_estimate * 1.15
-    return volume_estimate
+    early = weeks_postpartum < EARLY_POSTPARTUM_WEEKS
+    return float(volume_estimate * (1.0 + (ENGORGEMENT_FACTOR - 1.0) * early))
 
 
 # -----------------------------------------------------------------------------
@@ -221,51 +237,82 @@ def apply_growth_curve(volume_estimate: float, weeks_postpartum: int) -> float:
 # CALIBRATION NOTE:
 # The Hemi-Ellipsoid formula produces lower raw values than the Box method.
 # These thresholds are tightened to the 2.0 - 15.0 range typical of this geometry.
-VOLUME_SIZE_MAP = {
-    2.5: "32A",
-    3.5: "32B",
-    4.5: "34B",
-    5.5: "32C",
-    6.5: "34C",
-    7.5: "36B",
-    8.5: "32D",
-    9.5: "34D",
-    10.5: "36C",
-    11.5: "38B",
-    12.5: "34DD",
-    13.5: "36D",
-    14.5: "38C",
-    16.0: "40C",
-    18.0: "36DD",
-    20.0: "38D",
-    float("inf"): "Size Check Required",  # Catch-all for high-variance inputs
-}
+# Stored as a sorted threshold array plus a parallel tuple of sizes: a volume maps
+# to the first threshold it does not exceed (np.searchsorted, side="left").
+_THRESHOLDS = np.array(
+    [2.5, 3.5, 4.5, 5.5, 6.5, 7.5, 8.5, 9.5, 10.5, 11.5, 12.5, 13.5, 14.5, 16.0, 18.0, 20.0,
+     np.inf],
+    dtype=np.float32,
+)
+_SIZES = (
+    "32A",
+    "32B",
+    "34B",
+    "32C",
+    "34C",
+    "36B",
+    "32D",
+    "34D",
+    "36C",
+    "38B",
+    "34DD",
+    "36D",
+    "38C",
+    "40C",
+    "36DD",
+    "38D",
+    "Size Check Required",  # Catch-all for high-variance inputs
+)
+_LAST_SIZE_INDEX = len(_SIZES) - 1
+
+
+@njit(cache=True)
+def _size_index(volume_adjusted):
+    """Index into _SIZES for an adjusted volume."""
+    # NaN sorts past +inf, so clamp onto the catch-all size
+    return min(np.searchsorted(_THRESHOLDS, volume_adjusted, side="left"), _LAST_SIZE_INDEX)
 
 
 def volume_to_bra_size(volume_adjusted: float) -> str:
     """
     Map adjusted volume estimate to bra size using the recalibrated thresholds.
     """
-    for threshold, size in VOLUME_SIZE_MAP.items():
-        if volume_adjusted <= threshold:
-            return size
+    return _SIZES[int(_size_index(volume_adjusted))]
 
-    return "Size Check Required"
+
+# Explicit signature: compiled when logic.py is imported, not on the first request.
+@njit("Tuple((f4, f4, i4))(f4[:, :], f4[:, :], i4)", cache=True)
+def _compute_core(front_pts, side_pts, weeks_postpartum):
+    """
+    Numeric core of compute_bra_fit on (33, 3) landmark arrays.
+    Returns (volume_estimate, volume_adjusted, index into _SIZES).
+    """
+    growth = _growth_factor(weeks_postpartum)
+    front = _torso_landmarks(front_pts)
+    side = _torso_landmarks(side_pts)
+    volume_estimate = _hemi_ellipsoid_volume(
+        front[0], front[1], side[2], side[3], side[0], side[1]
+    )
+    volume_adjusted = volume_estimate * growth
+    size_index = _size_index(volume_adjusted)
+    return (
+        np.float32(volume_estimate),
+        np.float32(volume_adjusted),
+        np.int32(size_index),
+    )
 
 
 def compute_bra_fit(
-    front_pose_results,
-    side_pose_results,
+    front_pts: Optional[np.ndarray],
+    side_pts: Optional[np.ndarray],
     weeks_postpartum: int,
 ) -> BraFitResult:
     """
     Full pipeline: extract landmarks, estimate volume, apply growth curve,
     and map to bra size.
+    Takes the (33, 3) arrays from landmarks_to_array; None means no pose was found.
     """
-    front_landmarks = extract_landmarks(front_pose_results)
-    side_landmarks = extract_landmarks(side_pose_results)
-
-    if front_landmarks is None or side_landmarks is None:
+    if front_pts is None or side_pts is None:
         return BraFitResult(
             volume_estimate=0.0,
             volume_adjusted=0.0,
@@ -273,13 +320,13 @@ def compute_bra_fit(
             landmarks_detected=False,
         )
 
-    volume_estimate = calculate_volume_estimate(front_landmarks, side_landmarks)
-    volume_adjusted = apply_growth_curve(volume_estimate, weeks_postpartum)
-    recommended_size = volume_to_bra_size(volume_adjusted)
+    volume_estimate, volume_adjusted, size_index = _compute_core(
+        front_pts, side_pts, weeks_postpartum
+    )
 
     return BraFitResult(
-        volume_estimate=volume_estimate,
-        volume_adjusted=volume_adjusted,
-        recommended_size=recommended_size,
+        volume_estimate=float(volume_estimate),
+        volume_adjusted=float(volume_adjusted),
+        recommended_size=_SIZES[size_index],
         landmarks_detected=True,
     )